@@ -1,7 +1,7 @@
-from .core.io.qtio import QtIOBackend
-from .core.io.image import Image
 from . import gui
+import logging
 
 def init():
-	Image.set_backend(QtIOBackend)
+	# The image backend is loaded by the GUI once the window is visible.
+	logging.basicConfig(level=logging.INFO, format='%(message)s')
 	gui.start_gui()
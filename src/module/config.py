@@ -10,6 +10,7 @@ import sys
 app-theme = 0 # 0/1/2
 reload-on-export = false # true/false
 hijack-target = ".../.../hl2.exe" # path/""
+last-directory = ".../..." # path/""
 '''
 
 if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
@@ -33,6 +34,7 @@ class AppConfig():
 	appTheme = AppTheme.Default
 	reloadOnExport = True
 	hijackTarget: str|None = None
+	lastDirectory: str = ''
 
 def load_config(gui=True) -> AppConfig:
 	if not config_path.is_file():
@@ -58,6 +60,10 @@ def load_config(gui=True) -> AppConfig:
 			rawHijackOpt: str|None = rawConf.get('hijack-target', None)
 			if not rawHijackOpt: rawHijackOpt = None
 			parsed.hijackTarget = rawHijackOpt
+
+			rawLastDir: str = rawConf.get('last-directory', '')
+			if not isinstance(rawLastDir, str): rawLastDir = ''
+			parsed.lastDirectory = rawLastDir
 	
 	except Exception:
 		print('Failed to load the configuration!\n\n', format_exc())
@@ -76,6 +82,7 @@ def save_config(conf: AppConfig):
 		toml['app-theme'] = conf.appTheme
 		toml['reload-on-export'] = conf.reloadOnExport
 		toml['hijack-target'] = conf.hijackTarget or ''
+		toml['last-directory'] = conf.lastDirectory
 		tomlkit.dump(toml, file)
 
 def make_config():
@@ -84,5 +91,6 @@ def make_config():
 			f'# Generated by PBR-2-Source v{__version__}\n'
 			'app-theme = 0\n',
 			'reload-on-export = true\n',
-			'hijack-target = ""\n'
+			'hijack-target = ""\n',
+			'last-directory = ""\n'
 		])
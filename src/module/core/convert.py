@@ -3,6 +3,7 @@
 from .material import Material, MaterialMode, Texture, GameTarget
 from . import texops
 from .io.image import Image
+from typing import Iterator
 
 def from_images(src: dict[str, Image], name: str, mode: MaterialMode, target: GameTarget) -> 'Material':
 	albedo = src.get('albedo')
@@ -21,45 +22,49 @@ def from_images(src: dict[str, Image], name: str, mode: MaterialMode, target: Ga
 	ao = src.get('ao')
 	height = src.get('height')
 
+	# Every map is combined with the others, so they must all share one size.
+	size = normal.size
+
 	return Material(
 		mode,
 		GameTarget.V2011,
-		normal.size,
+		size,
 		name,
-		albedo=texops.normalize(albedo, mode='RGB'),
-		roughness=texops.normalize(roughness, normal.size, mode='L'),
-		metallic=texops.normalize(metallic, normal.size, mode='L'),
-		emit=texops.normalize(emit, albedo.size, mode='L') if emit else None,
-		ao=texops.normalize(ao, albedo.size, mode='L') if ao else None,
-		normal=texops.normalize(normal, mode='RGB'),
-		height=texops.normalize(height, normal.size, mode='L') if height else None
+		albedo=texops.normalize(albedo, size, mode='RGB'),
+		roughness=texops.normalize(roughness, size, mode='L'),
+		metallic=texops.normalize(metallic, size, mode='L'),
+		emit=texops.normalize(emit, size, mode='L') if emit else None,
+		ao=texops.normalize(ao, size, mode='L') if ao else None,
+		normal=texops.normalize(normal, size, mode='RGB'),
+		height=texops.normalize(height, size, mode='L') if height else None
 	)
 
 def export(src: Material) -> list[Texture]:
+	return list(iter_export(src))
+
+def iter_export(src: Material) -> Iterator[Texture]:
+	''' Builds the textures of a material one at a time, so that each can be saved while the next is created. '''
 
-	textures = []
 	basecolor = texops.make_basecolor(src)
 	basecolor = basecolor.convert('uint8')
-	textures.append(Texture(basecolor, '_albedo'))
+	yield Texture(basecolor, '_albedo')
 
 	bumpmap = texops.make_bumpmap(src)
 	bumpmap = bumpmap.convert('uint8')
-	textures.append(Texture(bumpmap, '_bump'))
+	yield Texture(bumpmap, '_bump')
 
 	if MaterialMode.is_pbr(src.mode):
 		mrao = texops.make_mrao(src)
 		mrao = mrao.convert('uint8')
-		textures.append(Texture(mrao, '_mrao'))
+		yield Texture(mrao, '_mrao')
 		
 	else:
 		if MaterialMode.has_phong(src.mode):
 			phong_exp = texops.make_phong_exponent(src)
 			phong_exp = phong_exp.convert('uint8', clip=True)
-			textures.append(Texture(phong_exp, '_phongexp'))
+			yield Texture(phong_exp, '_phongexp')
 
 		if not MaterialMode.embed_envmap(src.mode):
 			envmap_mask = texops.make_envmask(src)
 			envmap_mask = envmap_mask.convert('uint8')
-			textures.append(Texture(envmap_mask, '_envmap'))
-
-	return textures
+			yield Texture(envmap_mask, '_envmap')
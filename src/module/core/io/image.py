@@ -3,6 +3,7 @@ from numpy.typing import DTypeLike
 from pathlib import Path
 from typing import Literal
 from abc import abstractmethod
+from functools import lru_cache
 
 class IOBackend():
 	'''
@@ -25,6 +26,13 @@ class IOBackend():
 	def resize(image: 'Image', dims: tuple[int, int]) -> 'Image':
 		...
 
+@lru_cache(maxsize=8)
+def uint8_table(dtype: np.dtype) -> np.ndarray:
+	''' Returns a lookup table that maps every uint8 value to its normalized equivalent in a float dtype. '''
+	table = (np.arange(256) * (1 / 255)).astype(dtype)
+	table.flags.writeable = False
+	return table
+
 class Image():
 	'''
 	This class serves as a non-shit backend for vaguely-advanced image operations.
@@ -82,12 +90,20 @@ class Image():
 		obj_dtype = np.dtype(dtype)
 		max_from: int = 1 if self.data.dtype.kind == 'f' else 2**(self.data.dtype.itemsize*8) - 1
 		max_to: int   = 1 if obj_dtype.kind == 'f' else 2**(obj_dtype.itemsize*8) - 1
-		new_data = self.data.copy('C') * (max_to / max_from)
+
+		# Both branches make a single C-ordered copy, rather than copying before scaling and casting.
+		if max_to == max_from:
+			new_data = self.data.astype(obj_dtype, order='C')
+		elif self.data.dtype == np.uint8 and obj_dtype.kind == 'f':
+			# Lookups into a 256 entry table are cheaper than the float multiply.
+			new_data = uint8_table(obj_dtype)[self.data]
+		else:
+			new_data = np.multiply(self.data, max_to / max_from, order='C')
 
 		if clip:
 			new_data = new_data.clip(0, max_to)
 
-		return Image(new_data.astype(obj_dtype))
+		return Image(new_data.astype(obj_dtype, copy=False))
 
 	def split(self) -> list["Image"]:
 		''' Returns this image's data as a list of channels '''
@@ -106,7 +122,7 @@ class Image():
 			return Image.merge(( s[0], s[1], s[2], Image.blank(self.size, dtype=self.data.dtype, color=(1,)) ))
 		if self.channels == 4:
 			if mode == 'L': return self.split()[0]
-			if mode == 'RGB': return Image.merge(tuple(self.split()[:3]))
+			if mode == 'RGB': return Image(self.data[:, :, :3])
 			return self
 
 		raise ValueError(f'Image has unrecognized number of channels ({self.channels})! Failed to convert to {mode}!')
@@ -1,12 +1,14 @@
 from pathlib import Path
 from .image import Image, IOBackend
 
-from PySide6.QtGui import QImage, QColorSpace, QColor
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage, QImageReader, QColorSpace, QColor
+from PySide6.QtCore import Qt, QBuffer, QIODevice
 
 import numpy as np
 from srctools.vtf import VTF, VTFFlags, ImageFormats
 from typing import IO
+from io import BytesIO
+import os
 
 qimage_test: QImage|None = None
 
@@ -17,6 +19,11 @@ def load_vtf(file: IO[bytes]):
 	data = np.array(frame._data).reshape((frame.width, frame.height, 4))
 	return Image(data)
 
+def read_vtf_header(path: str|Path) -> VTF:
+	''' Reads the metadata of a VTF without decoding any of its frames. '''
+	with open(path, 'rb') as file:
+		return VTF.read(file, header_only=True)
+
 def image_to_qimage(image: Image) -> QImage:
 	''' Converts an Image to a Qt QImage. (U8) '''
 	size = image.size
@@ -30,21 +37,59 @@ def qimage_to_image(im: QImage) -> Image:
 	src = np.frombuffer(ptr, dtype=np.float16).copy().reshape(im.height(), im.width(), 4)
 	return Image(src)
 
+def read_file(path: str|Path) -> bytes:
+	''' Reads a whole file in one go, so that it can be decoded without Qt probing the filesystem. '''
+	with open(path, 'rb') as file:
+		return file.read()
+
+def image_format(path: str|Path) -> str:
+	''' Returns the Qt image format hint for a path. Formats without a signature, like TGA, can't be decoded without one. '''
+	return os.path.splitext(path)[1][1:].lower()
+
+def qimage_from_bytes(data: bytes, path: str|Path) -> QImage:
+	''' Decodes an image that has already been read into memory. The path is only used as a format hint. '''
+	if image_format(path) == 'vtf':
+		return image_to_qimage(load_vtf(BytesIO(data)))
+
+	# Files are often saved with the wrong extension, so fall back to detecting the format from the contents.
+	im = QImage()
+	if not im.loadFromData(data, image_format(path)): im.loadFromData(data)
+	im.convertToColorSpace(QColorSpace.NamedColorSpace.SRgbLinear)
+	return im
+
 class QtIOBackend(IOBackend):
 	@staticmethod
 	def load_qimage(path: str|Path) -> QImage:
-		if (str(path).endswith('.vtf')):
-			with open(path, 'rb') as file:
-				return image_to_qimage(load_vtf(file))
-			
-		im = QImage()
-		im.load(str(path))
-		im.convertToColorSpace(QColorSpace.NamedColorSpace.SRgbLinear)
+		im = qimage_from_bytes(read_file(path), path)
+		if im.isNull(): raise ValueError(f'Could not decode {path}!')
 		return im
 
+	@staticmethod
+	def load_thumbnail(path: str|Path, size: int) -> QImage:
+		''' Loads a downscaled preview of an image. Where the format allows it, the image is scaled while decoding. '''
+		data = read_file(path)
+		buffer = QBuffer()
+		buffer.setData(data)
+		buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+
+		reader = QImageReader(buffer, image_format(path).encode())
+		if not reader.canRead():
+			# The extension may be wrong, so let Qt detect the format from the contents instead.
+			buffer.seek(0)
+			reader = QImageReader(buffer)
+		if reader.canRead() and reader.size().isValid():
+			reader.setScaledSize(reader.size().scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio))
+			im = reader.read()
+			if not im.isNull(): return im
+
+		# VTFs and some other formats can't be decoded at a smaller size. Decode them fully and scale afterwards.
+		im = qimage_from_bytes(data, path)
+		if im.isNull(): return im
+		return im.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
 	@staticmethod
 	def load(path: str|Path) -> Image:
-		if (str(path).endswith('.vtf')):
+		if image_format(path) == 'vtf':
 			with open(path, 'rb') as file:
 				return load_vtf(file)
 
@@ -55,7 +100,7 @@ class QtIOBackend(IOBackend):
 		height, width, bands = image.data.shape
 
 		path = Path(path)
-		if path.suffix !='.vtf':
+		if image_format(path) != 'vtf':
 			raise NotImplementedError(f'Failed to save {path.name} . Use imageio backend for non-vtf output!')
 
 		format = None
@@ -79,12 +124,19 @@ class QtIOBackend(IOBackend):
 		vtf = VTF(width, height, (7, version), fmt=format, flags=flags)
 		vtf.get().copy_from(image.data.tobytes('C'), format)
 
-		with open(path, 'wb') as file:
-			vtf.save(file)
+		# srctools writes the header and every mipmap separately, so collect them in memory and write once.
+		buffer = BytesIO()
+		vtf.save(buffer)
+		with open(path, 'wb', buffering=0) as file:
+			# Raw writes may be partial, though the whole file normally goes out in one syscall.
+			data = buffer.getbuffer()
+			while len(data):
+				data = data[file.write(data):]
 	
 	@staticmethod
 	def resize(image: Image, dims: tuple[int, int]) -> Image:
-		# TODO: This causes segfaults sometimes. WTF?
+		# The QImage is read as RGBA, so anything with fewer channels would be read past its end.
+		if image.channels != 4: image = image.normalize('RGBA')
 		qimage = image_to_qimage(image)
 		qimage = qimage.scaled(dims[0], dims[1], Qt.AspectRatioMode.IgnoreAspectRatio)
 		return qimage_to_image(qimage)
@@ -2,6 +2,7 @@ from typing import Literal
 from .io.image import Image
 from .material import Material, MaterialMode, NormalType
 import numpy as np
+from numpy.typing import DTypeLike
 
 '''
 References:
@@ -16,8 +17,8 @@ References:
 	phongmask     = ((1-roughness)^5.4) * 2
 '''
 
-def normalize(img: Image, size: tuple[int, int]|None=None, mode: Literal['L', 'RGB', 'RGBA']|None=None):
-	''' Normalizes an input image to function with other operations. '''
+def normalize(img: Image, size: tuple[int, int]|None=None, mode: Literal['L', 'RGB', 'RGBA']|None=None, dtype: DTypeLike=np.float16):
+	''' Normalizes an input image to function with other operations. The other operations expect float16, so only change dtype if you know what you're doing. '''
 
 	# All of this code is necessary to ensure that PIL imports work,
 	# but I do not yet know if the same issues apply to imageio.
@@ -37,7 +38,11 @@ def normalize(img: Image, size: tuple[int, int]|None=None, mode: Literal['L', 'R
 	if size:
 		img = img.resize(size)
 
-	img = img.convert(np.float16)
+	# Dropping channels only takes a view, so do it first and let convert copy just the channels that are kept.
+	if mode and img.channels > len(mode):
+		img = img.normalize(mode)
+
+	img = img.convert(dtype)
 
 	if mode:
 		img = img.normalize(mode)
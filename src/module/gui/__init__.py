@@ -1,19 +1,20 @@
 from ..version import __version__
-from ..config import AppConfig, AppTheme, load_config
+from ..config import AppConfig, AppTheme, load_config, save_config
 from ..core.material import GameTarget, MaterialMode
 from ..preset import Preset
 
 from .style import STYLESHEET_TILE_REQUIRED, STYLESHEET, STYLESHEET_MIN
-from .backend import CoreBackend, ImageRole
+from .tasks import DecodeSignals, DecodeTask, ExportSignals, ExportTask
 
-from typing import Any
+from typing import Any, TYPE_CHECKING
 from sys import argv, platform
 from traceback import format_exc
-import subprocess
+import logging
+import time
 
 from pathlib import Path
-from PySide6.QtCore import Qt, Signal, Slot, QSize, QMimeData, QKeyCombination, QFileSystemWatcher, QTimer
-from PySide6.QtGui import QDragEnterEvent, QMouseEvent, QImage, QPixmap, QColor, QDrag
+from PySide6.QtCore import Qt, Signal, Slot, QSize, QRect, QMimeData, QKeyCombination, QFileSystemWatcher, QTimer, QThreadPool
+from PySide6.QtGui import QDragEnterEvent, QMouseEvent, QImage, QPixmap, QPixmapCache, QPainter, QDrag
 from PySide6.QtWidgets import (
 	QWidget, QMainWindow, QFrame, QApplication, QMessageBox, QMenuBar,
 	QBoxLayout, QHBoxLayout, QVBoxLayout, QSizePolicy,
@@ -21,18 +22,87 @@ from PySide6.QtWidgets import (
 	QGroupBox, QProgressBar, QPushButton, QComboBox
 )
 
-from urllib.parse import unquote_plus, urlparse
+if TYPE_CHECKING:
+	from .backend import CoreBackend, ImageRole
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 48
+
+from urllib.parse import unquote, urlparse
 def uri_to_path(uri: str) -> str:
-	return unquote_plus(urlparse(uri).path)
+	''' Converts a dropped URI into a local path. Local file URIs, which are by far the most common, skip urllib entirely. '''
+	if uri.startswith('file:///'):
+		# Windows paths don't have a leading slash. (file:///C:/...)
+		path = uri[8:] if platform == 'win32' else uri[7:]
+	else:
+		path = urlparse(uri).path
+		if platform == 'win32': path = path[1:]
+	return unquote(path) if '%' in path else path
+
+def file_stamp(path: str|Path) -> tuple[int, int]|None:
+	''' Returns the modification time and size of a file, or None if it cannot be read. '''
+	try:
+		stat = Path(path).stat()
+		return (stat.st_mtime_ns, stat.st_size)
+	except OSError:
+		return None
+
+def thumbnail_key(path: Path) -> str|None:
+	''' Returns the QPixmapCache key for a file's thumbnail. Edits to the file on disk invalidate the key. '''
+	stamp = file_stamp(path)
+	if stamp == None: return None
+	return f'{path}:{stamp[0]}:{THUMBNAIL_SIZE}'
+
+PBR_ROLES: tuple[tuple[str, str, bool], ...] = (
+	('Basecolor', 'albedo', True),
+	('Roughness', 'roughness', True),
+	('Metallic', 'metallic', False),
+	('Bumpmap', 'normal', False),
+	('Heightmap', 'height', False),
+	('Ambient Occlusion', 'ao', False),
+	('Emission', 'emit', False),
+)
+''' The image inputs shown in the GUI. (Name, Kind, Required) '''
+
+GAME_ITEMS: tuple[tuple[str, GameTarget], ...] = (
+	('HL2: E2 / Portal / TF2', GameTarget.V2007),
+	('Portal 2 / Alien Swarm', GameTarget.V2011),
+	('Garry\'s Mod', GameTarget.VGMOD),
+	('CS:GO / Strata', GameTarget.V2023),
+)
+
+MODE_ITEMS: tuple[tuple[str, MaterialMode], ...] = (
+	('Model: PBR', MaterialMode.PBRModel),
+	('Model: Phong+Envmap', MaterialMode.PhongEnvmap),
+	('Model: Phong+Envmap+Alpha', MaterialMode.PhongEnvmapAlpha),
+	('Model: Phong+Envmap+Emission', MaterialMode.PhongEnvmapEmit),
+	('Brush: PBR', MaterialMode.PBRBrush),
+	('Brush: Envmap', MaterialMode.Envmap),
+	('Brush: Envmap+Alpha', MaterialMode.EnvmapAlpha),
+	('Brush: Envmap+Emission', MaterialMode.EnvmapEmit),
+)
+
+IMAGE_FILTER = 'Images (*.png *.jpg *.jpeg *.bmp *.tga *.tiff *.hdr)'
 
 class QDataComboBox( QComboBox ):
+	dataIndex: dict[Any, int]
+	''' Maps item data to the index of its first item. '''
+
+	def __init__(self, parent: QWidget|None = None) -> None:
+		super().__init__(parent)
+		self.dataIndex = {}
+
+	def addItem(self, text: str, data: Any = None):
+		self.dataIndex.setdefault(data, self.count())
+		super().addItem(text, data)
+
+	def clear(self):
+		self.dataIndex.clear()
+		super().clear()
+
 	def setCurrentData(self, data: Any):
-		index = -1
-		for i in range(self.count()):
-			if data == self.itemData(i):
-				index = i
-				break
-		self.setCurrentIndex(index)
+		self.setCurrentIndex(self.dataIndex.get(data, -1))
 
 class RClickToolButton( QToolButton ):
 	rightClicked = Signal( name='RightClicked' )
@@ -48,18 +118,23 @@ class PickableImage( QFrame ):
 	name: str
 	kind: str
 	required: bool
+	config: AppConfig
 	path: Path|None = None
+	lastEmpty: bool|None = None
+	lastPicked: tuple[Path|None, tuple[int, int]|None]|None = None
 	
 	path_box: QLineEdit
 	iconButton: QToolButton
 	icon: QPixmap
 
-	def __init__(self, name: str, kind: str, required: bool, parent: QWidget | None = None, f: Qt.WindowType = Qt.WindowType.Widget) -> None:
+	def __init__(self, name: str, kind: str, required: bool, config: AppConfig, parent: QWidget | None = None, f: Qt.WindowType = Qt.WindowType.Widget) -> None:
 		super().__init__(parent, f)
 		self.name = name
 		self.kind = kind
 		self.required = required
+		self.config = config
 		self.setAcceptDrops(True)
+		self.setProperty('required', required)
 
 		layout = QHBoxLayout()
 		layout.setContentsMargins(0, 0, 0, 0)
@@ -69,7 +144,11 @@ class PickableImage( QFrame ):
 		self.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Fixed)
 		self.setFixedHeight(48)
 
-		self.icon = QPixmap()
+		# Icons are painted into this pixmap, rather than allocating a new one for every pick.
+		dpr = self.devicePixelRatio()
+		self.icon = QPixmap(round(THUMBNAIL_SIZE * dpr), round(THUMBNAIL_SIZE * dpr))
+		self.icon.setDevicePixelRatio(dpr)
+		self.icon.fill(Qt.GlobalColor.transparent)
 		self.iconButton = RClickToolButton()
 		self.iconButton.setFixedSize(48, 48)
 		self.iconButton.setIcon(self.icon)
@@ -99,9 +178,14 @@ class PickableImage( QFrame ):
 		vlayout.addWidget(self.path_box)
 
 	def update_required(self):
-		if self.required:
-			self.iconButton.setStyleSheet('' if self.path else STYLESHEET_TILE_REQUIRED)
-			self.iconButton.update()
+		''' Re-evaluates the shared tile stylesheet, which highlights required tiles that are empty. '''
+		empty = self.path == None
+		if self.required and empty != self.lastEmpty:
+			self.lastEmpty = empty
+			self.setProperty('empty', empty)
+			style = self.iconButton.style()
+			style.unpolish(self.iconButton)
+			style.polish(self.iconButton)
 
 	def mousePressEvent(self, event: QMouseEvent) -> None:
 		if self.path == None or event.button() != Qt.MouseButton.LeftButton:
@@ -122,30 +206,33 @@ class PickableImage( QFrame ):
 
 	def dropEvent(self, event):
 		fileUrl = event.mimeData().text()
-		rawFilePath = uri_to_path(fileUrl)
-		if platform == 'win32': rawFilePath = rawFilePath[1:]
-		filePath = Path(rawFilePath)
+		filePath = Path(uri_to_path(fileUrl))
 		if not filePath.is_file(): return
 		event.accept()
 
 		self.path = filePath
 		self.reload()
 	
-	def set_icon(self, img: QImage|None):
+	def set_icon(self, img: QImage|QPixmap|None):
+		self.icon.fill(Qt.GlobalColor.transparent)
 		if img:
-			self.icon = self.icon.fromImage(img)
-			self.iconButton.setIcon(self.icon)
-		else:
-			self.icon.fill(QColor(0, 0, 0, 0))
-			self.iconButton.setIcon(self.icon)
-		print('Icon updated!')
+			size = img.size().scaled(THUMBNAIL_SIZE, THUMBNAIL_SIZE, Qt.AspectRatioMode.KeepAspectRatio)
+			target = QRect((THUMBNAIL_SIZE - size.width()) // 2, (THUMBNAIL_SIZE - size.height()) // 2, size.width(), size.height())
+
+			painter = QPainter(self.icon)
+			painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+			if isinstance(img, QPixmap):	painter.drawPixmap(target, img)
+			else:							painter.drawImage(target, img)
+			painter.end()
+		self.iconButton.setIcon(self.icon)
+		logger.debug('Icon updated! kind=%s', self.kind)
 
 	def on_icon_click(self):
-		fileUrls = QFileDialog.getOpenFileNames(self, caption=f'Selecting {self.kind} image', filter='Images (*.png *.jpg *.jpeg *.bmp *.tga *.tiff *.hdr)')[0]
-		if len(fileUrls) == 0: return
-		
-		url = Path(fileUrls[0])
-		self.path = url
+		fileUrl = QFileDialog.getOpenFileName(self, caption='Selecting ' + self.kind + ' image', dir=self.config.lastDirectory, filter=IMAGE_FILTER)[0]
+		if not len(fileUrl): return
+
+		self.path = Path(fileUrl)
+		self.config.lastDirectory = str(self.path.parent)
 		self.reload()
 
 	def on_icon_rclick(self):
@@ -153,6 +240,11 @@ class PickableImage( QFrame ):
 		self.reload()
 
 	def reload(self):
+		# Re-dropping the same unchanged file would only decode the same thumbnail again.
+		picked = (self.path, file_stamp(self.path) if self.path else None)
+		if picked == self.lastPicked: return
+		self.lastPicked = picked
+
 		self.path_box.setText(self.path.name if self.path else '')
 		self.picked.emit(self.kind, self.path, self.set_icon)
 		self.update_required()
@@ -170,11 +262,19 @@ class MainWindow( QMainWindow ):
 	watching: bool = False
 
 	watcherCooldown: QTimer
+	rewatchTimer: QTimer
 	watcher: QFileSystemWatcher
+	dirtyFiles: set[str]
+	firstDirtyTime: float = 0.0
 	config: AppConfig
-	backend: CoreBackend
+	backend: 'CoreBackend'
 	progressBar: QProgressBar
 
+	decodeSignals: DecodeSignals
+	exportSignals: ExportSignals
+	decodeRequests: dict[str, tuple[int, Any, str|None]]
+	watchStamps: dict[str, tuple[int, int]|None]
+
 	def __init__(self, config: AppConfig, parent=None) -> None:
 		#region init
 		super().__init__(parent)
@@ -185,14 +285,28 @@ class MainWindow( QMainWindow ):
 
 		self.watcherCooldown = QTimer()
 		self.watcherCooldown.setSingleShot(True)
-		self.watcherCooldown.timeout.connect(self.export)
+		self.watcherCooldown.timeout.connect(self.flush_changes)
 		# self.watcherCooldown.timeout.connect(lambda : print('YIPPEE!!'))
+		self.dirtyFiles = set()
+
+		self.rewatchTimer = QTimer()
+		self.rewatchTimer.setSingleShot(True)
+		self.rewatchTimer.timeout.connect(self.retry_rewatch)
 
 		self.watcher = QFileSystemWatcher(self)
 		self.watcher.fileChanged.connect(self.on_file_changed)
 
 		self.config = config
-		self.backend = CoreBackend()
+
+		# Maps each image role to its latest decode request, so that stale decodes can be dropped.
+		self.decodeRequests = {}
+		self.watchStamps = {}
+		self.decodeSignals = DecodeSignals(self)
+		self.decodeSignals.decoded.connect(self.decoded, Qt.ConnectionType.QueuedConnection)
+
+		self.exportSignals = ExportSignals(self)
+		self.exportSignals.done.connect(self.exported, Qt.ConnectionType.QueuedConnection)
+		self.exportSignals.failed.connect(self.export_failed, Qt.ConnectionType.QueuedConnection)
 
 		#endregion
 		''' ========================== MENU ========================== '''
@@ -236,6 +350,7 @@ class MainWindow( QMainWindow ):
 		root.addLayout(inner)
 
 		left = QGroupBox(title='Input')
+		left.setStyleSheet(STYLESHEET_TILE_REQUIRED)
 		leftLayout = QVBoxLayout(left)
 		inner.addWidget(left)
 
@@ -257,15 +372,7 @@ class MainWindow( QMainWindow ):
 				self.update_from_preset.connect(widget.from_preset)
 				parent.addWidget(widget)
 
-		registerWidgets(leftLayout, [
-			PickableImage('Basecolor', 'albedo', True),
-			PickableImage('Roughness', 'roughness', True),
-			PickableImage('Metallic', 'metallic', False),
-			PickableImage('Bumpmap', 'normal', False),
-			PickableImage('Heightmap', 'height', False),
-			PickableImage('Ambient Occlusion', 'ao', False),
-			PickableImage('Emission', 'emit', False)
-		])
+		registerWidgets(leftLayout, [PickableImage(name, kind, required, self.config) for name, kind, required in PBR_ROLES])
 
 		#endregion
 		''' ========================== RIGHT ========================== '''
@@ -275,12 +382,7 @@ class MainWindow( QMainWindow ):
 
 		self.gameDropdown = gameDropdown = QDataComboBox()
 		rightLayout.addWidget(gameDropdown)
-		for text,data in [
-			('HL2: E2 / Portal / TF2', GameTarget.V2007),
-			('Portal 2 / Alien Swarm', GameTarget.V2011),
-			('Garry\'s Mod', GameTarget.VGMOD),
-			('CS:GO / Strata', GameTarget.V2023),
-		]: gameDropdown.addItem(text, data)
+		for text,data in GAME_ITEMS: gameDropdown.addItem(text, data)
 		gameDropdown.setCurrentData(Preset.game)
 
 		def on_changed_game(x: int):
@@ -291,16 +393,7 @@ class MainWindow( QMainWindow ):
 
 		self.modeDropdown = modeDropdown = QDataComboBox()
 		rightLayout.addWidget(modeDropdown)
-		for text,data in [
-			('Model: PBR', MaterialMode.PBRModel),
-			('Model: Phong+Envmap', MaterialMode.PhongEnvmap),
-			('Model: Phong+Envmap+Alpha', MaterialMode.PhongEnvmapAlpha),
-			('Model: Phong+Envmap+Emission', MaterialMode.PhongEnvmapEmit),
-			('Brush: PBR', MaterialMode.PBRBrush),
-			('Brush: Envmap', MaterialMode.Envmap),
-			('Brush: Envmap+Alpha', MaterialMode.EnvmapAlpha),
-			('Brush: Envmap+Emission', MaterialMode.EnvmapEmit),
-		]: modeDropdown.addItem(text, data)
+		for text,data in MODE_ITEMS: modeDropdown.addItem(text, data)
 		modeDropdown.setCurrentData(Preset.mode)
 	
 		def on_changed_mode(x: int):
@@ -365,6 +458,7 @@ class MainWindow( QMainWindow ):
 		self.progressBar = QProgressBar()
 		self.progressBar.setValue(0)
 		self.progressBar.setMaximum(100)
+		self.exportSignals.progress.connect(self.progressBar.setValue, Qt.ConnectionType.QueuedConnection)
 		footer.addWidget(self.progressBar)
 
 		self.exportButton = QPushButton('Export As...')
@@ -374,55 +468,104 @@ class MainWindow( QMainWindow ):
 		#endregion
 
 	@Slot()
-	def picked(self, kind: ImageRole, path: Path|None, set_icon):
-		img = self.backend.pick(str(path) if path else None, kind)
+	def finish_init(self):
+		''' Loads the image backend. This is deferred until the window has been shown, since it takes a while to import. '''
+		from ..core.io.image import Image
+		from ..core.io.qtio import QtIOBackend
+		from .backend import CoreBackend
+
+		Image.set_backend(QtIOBackend)
+		self.backend = CoreBackend()
+		self.backend.game = self.gameDropdown.currentData()
+		self.backend.mode = self.modeDropdown.currentData()
+
+	@Slot()
+	def picked(self, kind: 'ImageRole', path: Path|None, set_icon):
+		requestId = self.decodeRequests.get(kind, (0, None, None))[0] + 1
+		self.backend.set_path(kind, str(path) if path else None)
 		self.reset_watch()
-		set_icon(img)
+
+		if path == None:
+			self.decodeRequests[kind] = (requestId, None, None)
+			set_icon(None)
+			return
+
+		# The backend decodes the full image on export, so only a thumbnail is needed. Reuse it if it is still cached.
+		key = thumbnail_key(path)
+		if key != None and (cached := QPixmapCache.find(key)) != None:
+			self.decodeRequests[kind] = (requestId, None, None)
+			set_icon(cached)
+			return
+
+		# Decoding is slow, so do it on a worker. The icon is updated once the thumbnail comes back.
+		self.decodeRequests[kind] = (requestId, set_icon, key)
+		QThreadPool.globalInstance().start(DecodeTask(kind, str(path), THUMBNAIL_SIZE, requestId, self.decodeSignals))
+
+	@Slot()
+	def decoded(self, kind: 'ImageRole', requestId: int, thumbnail: QImage|None):
+		latestId, set_icon, key = self.decodeRequests.get(kind, (0, None, None))
+		if requestId != latestId or set_icon == None: return
+
+		if thumbnail == None:
+			set_icon(None)
+			return
+
+		icon = QPixmap.fromImage(thumbnail)
+		if key != None: QPixmapCache.insert(key, icon)
+		set_icon(icon)
 
 	def pick_target(self):
-		print('Picking target')
-		targetPath = QFileDialog.getSaveFileName(self, caption='Saving material...', filter='Valve Material (*.vmt)')[0]
-		if len(targetPath): self.target = targetPath
+		logger.info('Picking target')
+		targetPath = QFileDialog.getSaveFileName(self, caption='Saving material...', dir=self.config.lastDirectory, filter='Valve Material (*.vmt)')[0]
+		if len(targetPath):
+			self.target = targetPath
+			self.config.lastDirectory = str(Path(targetPath).parent)
 
 	@Slot()
 	def export(self):
+		self.run_export(self.config.reloadOnExport)
+
+	def run_export(self, noCache: bool):
 		if self.exporting: return
+
+		# Report missing images right away, rather than after asking where to save.
+		try:
+			self.backend.check_inputs()
+		except ValueError as e:
+			self.export_failed(e, format_exc())
+			return
+
+		if self.target == None: self.pick_target()
+		if self.target == None:
+			logger.info('The export was cancelled by the user.')
+			return
+
 		self.exporting = True
-			
-		print('Exporting...')
+		logger.info('Exporting...')
 		self.exportButton.setEnabled(False)
 		self.progressBar.setValue(0)
-		QApplication.processEvents()
 
-		try:
-			material = self.backend.make_material(self.config.reloadOnExport)
-			self.progressBar.setValue(50)
+		# The export finishes in exported() or export_failed()
+		QThreadPool.globalInstance().start(ExportTask(self.backend, self.target, noCache, self.exportSignals))
 
-			if self.target == None: self.pick_target()
-			if self.target == None: raise InterruptedError()
-			
-			targetPath: str = self.target # type: ignore
+	@Slot()
+	def exported(self):
+		self.exportButton.setEnabled(True)
+		self.exporting = False
 
-			self.backend.pick_vmt(targetPath)
-			self.backend.export(material)
-			self.progressBar.setValue(100)
+		if self.config.hijackTarget:
+			import subprocess
+			subprocess.Popen([self.config.hijackTarget, '-hijack', f'+mat_reloadmaterial {self.backend.name}'])
 
-			if self.config.hijackTarget:
-				subprocess.Popen([self.config.hijackTarget, '-hijack', f'+mat_reloadmaterial {self.backend.name}'])
-	
-		except Exception as e:
-			self.progressBar.setValue(0)
-
-			if isinstance(e, InterruptedError):
-				print('The export was cancelled by the user.')
-			else:
-				print('The export failed!\n\n', format_exc())
-				message = QMessageBox(QMessageBox.Icon.Critical, 'Failed to export!', str(e))
-				message.exec()
-		
-		finally:
-			self.exportButton.setEnabled(True)
-			self.exporting = False
+	@Slot()
+	def export_failed(self, e: Exception, trace: str):
+		self.exportButton.setEnabled(True)
+		self.exporting = False
+		self.progressBar.setValue(0)
+
+		logger.error('The export failed!\n\n%s', trace)
+		message = QMessageBox(QMessageBox.Icon.Critical, 'Failed to export!', str(e))
+		message.exec()
 
 	@Slot()
 	def export_as(self):
@@ -439,31 +582,35 @@ class MainWindow( QMainWindow ):
 		self.watching = not self.watching
 		if self.watching:	self.start_watch()
 		else:				self.stop_watch()
-		print('Watching:', self.watcher.files())
+		logger.info('Watching: %s', self.watcher.files())
 	
+	def watch_paths(self) -> set[str]:
+		return {x for x in self.backend.paths.values() if x != None}
+
 	def start_watch(self):
 		self.watchAction.setText('Stop Watching')
-		paths = [x for x in [
-			self.backend.albedoPath,
-			self.backend.roughnessPath,
-			self.backend.metallicPath,
-			self.backend.emitPath,
-			self.backend.aoPath,
-			self.backend.normalPath,
-			self.backend.heightPath,
-		] if x != None]
-		self.watcher.addPaths(paths)
+		paths = self.watch_paths()
+		self.watchStamps = {x: file_stamp(x) for x in paths}
+		if len(paths): self.watcher.addPaths(list(paths))
 
 	def stop_watch(self):
 		self.watchAction.setText('Watch')
+		self.rewatchTimer.stop()
 		self.watcher.removePaths(self.watcher.files())
 
 	def reset_watch(self):
 		if not self.watching: return
-		print('Resetting watch...')
-		self.stop_watch()
-		self.start_watch()
-		print('Watching:', self.watcher.files())
+		logger.debug('Resetting watch...')
+
+		# Only touch the paths that changed, instead of rebuilding every watch.
+		paths = self.watch_paths()
+		removed = [x for x in self.watchStamps if x not in paths]
+		added = [x for x in paths if x not in self.watchStamps]
+		if len(removed): self.watcher.removePaths(removed)
+		if len(added): self.watcher.addPaths(added)
+
+		self.watchStamps = {x: self.watchStamps[x] if x in self.watchStamps else file_stamp(x) for x in paths}
+		logger.debug('Watching: %s', self.watcher.files())
 
 	def force_stop_watch(self, issue: str='An error occurred!'):
 		if not self.watching: return
@@ -472,14 +619,70 @@ class MainWindow( QMainWindow ):
 
 	@Slot()
 	def on_file_changed(self, file: str):
-		assert self.watching, 'SOMETHING HAS GONE VERY WRONG HERE!!'
-		print('File changed:', file)
-		self.watcherCooldown.start(500)
+		# Qt may still deliver events for paths that were just removed.
+		if not self.watching: return
+		logger.debug('File changed: %s', file)
+
+		# Do this before the stamp check, since a replaced file may keep its stamp and would never be re-added.
+		self.rewatch()
+
+		# Editors often touch files without changing them. Only export if the contents could have changed.
+		stamp = file_stamp(file)
+		if stamp != None and stamp == self.watchStamps.get(file): return
+		self.watchStamps[file] = stamp
+
+		# Saving a material usually touches several files at once, so coalesce the changes into one export.
+		# A steady stream of changes must not postpone the export forever, though.
+		now = time.monotonic()
+		if not len(self.dirtyFiles): self.firstDirtyTime = now
+		self.dirtyFiles.add(file)
+
+		if now - self.firstDirtyTime > 2.0:
+			self.watcherCooldown.stop()
+			self.flush_changes()
+		else:
+			self.watcherCooldown.start(250)
+
+	def rewatch(self) -> list[str]:
+		'''
+		Re-adds watched files that Qt has dropped, which happens when editors save by replacing the file.
+		Files that are still missing are retried later. Returns the paths that were re-added.
+		'''
+		watched = set(self.watcher.files())
+		dropped = [x for x in self.watchStamps if x not in watched]
+		found = [x for x in dropped if Path(x).is_file()]
+		if len(found): self.watcher.addPaths(found)
+		if len(found) < len(dropped): self.rewatchTimer.start(500)
+		return found
+
+	@Slot()
+	def retry_rewatch(self):
+		''' Re-adds files that were missing earlier. Anything that has changed since then is exported. '''
+		if not self.watching: return
+		for file in self.rewatch(): self.on_file_changed(file)
+
+	@Slot()
+	def flush_changes(self):
+		''' Exports the material once for a burst of file changes. Only the changed images are re-decoded. '''
+		if self.exporting:
+			# Try again once the running export has finished.
+			self.watcherCooldown.start(250)
+			return
+
+		dirty = self.dirtyFiles
+		self.dirtyFiles = set()
+		if not self.watching or not len(dirty): return
+
+		self.rewatch()
+
+		for file in dirty: self.backend.invalidate(file)
+		self.run_export(False)
 
 	@Slot()
 	def load_preset(self):
-		selected = QFileDialog.getOpenFileName(self, caption='Loading preset...', filter='JSON Presets (*.json)')[0]
+		selected = QFileDialog.getOpenFileName(self, caption='Loading preset...', dir=self.config.lastDirectory, filter='JSON Presets (*.json)')[0]
 		if not len(selected): return
+		self.config.lastDirectory = str(Path(selected).parent)
 
 		# Reset target path
 		self.target = None
@@ -492,8 +695,9 @@ class MainWindow( QMainWindow ):
 		self.update_from_preset.emit(preset)
 	
 	def save_preset(self):
-		selected = QFileDialog.getSaveFileName(self, caption='Saving preset...', filter='JSON Presets (*.json)')[0]
+		selected = QFileDialog.getSaveFileName(self, caption='Saving preset...', dir=self.config.lastDirectory, filter='JSON Presets (*.json)')[0]
 		if not len(selected): return
+		self.config.lastDirectory = str(Path(selected).parent)
 
 		# Reset target path
 		self.target = None
@@ -505,11 +709,15 @@ class MainWindow( QMainWindow ):
 def start_gui():
 	app: QApplication = QApplication()
 	app_config = load_config()
+	QPixmapCache.setCacheLimit(51200)
+	lastDirectory = app_config.lastDirectory
 
-	if '--style-fusion' in argv: app_config.appTheme = AppTheme.Fusion
-	if '--style-native' in argv: app_config.appTheme = AppTheme.Native
+	# Command line overrides shouldn't end up in the saved config.
+	appTheme = app_config.appTheme
+	if '--style-fusion' in argv: appTheme = AppTheme.Fusion
+	if '--style-native' in argv: appTheme = AppTheme.Native
 
-	match app_config.appTheme:
+	match appTheme:
 		case AppTheme.Default:
 			app.setStyle( 'Fusion' )
 			app.setFont( 'Inter' )
@@ -520,7 +728,14 @@ def start_gui():
 
 	win = MainWindow( app_config )
 	win.show()
+	QTimer.singleShot(0, win.finish_init)
 	app.exec()
 
+	if app_config.lastDirectory != lastDirectory:
+		try:
+			save_config(app_config)
+		except Exception:
+			logger.error('Failed to save the configuration!\n\n%s', format_exc())
+
 if __name__ == '__main__':
 	start_gui()
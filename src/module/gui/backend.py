@@ -1,18 +1,76 @@
 # from PySide6.QtCore import Signal, Slot
 # from PySide6.QtCore import Qt
-from PySide6.QtGui import QImage, QColorSpace
+from PySide6.QtGui import QColorSpace
 
-from ..core.io.qtio import QtIOBackend, qimage_to_image, image_to_qimage
+from ..core.io.qtio import QtIOBackend, qimage_to_image, read_vtf_header, image_format
 
 from ..core import texops
-from ..core.convert import export as core_export
+from ..core.convert import iter_export as core_iter_export
 from ..core.vmt import make_vmt as core_make_vmt
 from ..core.io.image import Image
-from ..core.material import Material, MaterialMode, GameTarget
+from ..core.material import Material, MaterialMode, GameTarget, Texture
 from ..preset import Preset
 
 from pathlib import Path
 from enum import StrEnum
+from typing import Callable, Iterable, Literal, TypeVar
+from functools import partial, lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from srctools.vtf import VTF, VTFFlags, ImageFormats
+import numpy as np
+import threading
+import shutil
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DECODE_CACHE_SIZE = 8
+''' Maximum number of decoded images to keep around. Should be at least the number of roles. '''
+
+NATIVE_FORMATS = {'vtf', 'hdr'}
+''' Formats that QtIOBackend.load decodes straight to an Image, without going through a QImage. '''
+
+MATERIAL_DTYPE = np.float16
+''' The dtype that every map of a material is normalized to. '''
+
+PARALLEL_MIN_PIXELS = 512 * 512
+''' Smaller images are processed serially, since spinning up a thread pool would cost more than it saves. '''
+
+T = TypeVar('T')
+
+def run_jobs(size: tuple[int, int], jobs: Iterable[tuple[str, Callable[[], T]]]) -> dict[str, T]:
+	'''
+	Runs independent per-image jobs, on a thread pool when the images are large enough to benefit from it.
+	Jobs are started as soon as they are produced, so a generator can keep preparing the next one in the meantime.
+	'''
+	workers = os.cpu_count() or 1
+	if size[0] * size[1] < PARALLEL_MIN_PIXELS or workers < 2:
+		return {key: job() for key, job in jobs}
+
+	# Most of the work happens in numpy, Qt and srctools, which release the GIL.
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		futures = {key: pool.submit(job) for key, job in jobs}
+		return {key: future.result() for key, future in futures.items()}
+
+@lru_cache(maxsize=4)
+def blank(size: tuple[int, int], color: tuple[float, ...]) -> Image:
+	''' Returns a shared, read-only blank image. normalize copies its input, so they are never modified by conversion. '''
+	# Made in the dtype normalize outputs, so they take half the memory of the float32 default.
+	image = Image.blank(size, color, MATERIAL_DTYPE)
+	image.data.flags.writeable = False
+	return image
+
+@lru_cache(maxsize=256)
+def parse_material_name(pathStr: str) -> tuple[Path, str]:
+	''' Splits the path of a VMT into its folder and its material name, which is relative to the closest materials folder. '''
+	path = Path(pathStr)
+	# The leading slash lets a relative path that starts with the materials folder match too.
+	posixPath = '/' + path.as_posix()
+	start = posixPath.rfind('/materials/')
+	name = posixPath[start + len('/materials/'):] if start >= 0 else path.name
+	return (path.parent, name.removesuffix('.vmt'))
 
 class ImageRole(StrEnum):
 	Albedo = 'albedo'
@@ -24,30 +82,37 @@ class ImageRole(StrEnum):
 	Height = 'height'
 
 class CoreBackend():
-	albedo: Image|None = None
-	roughness: Image|None = None
-	metallic: Image|None = None
-	emit: Image|None = None
-	ao: Image|None = None
-	normal: Image|None = None
-	height: Image|None = None
-
-	albedoPath: str|None = None
-	roughnessPath: str|None = None
-	metallicPath: str|None = None
-	emitPath: str|None = None
-	aoPath: str|None = None
-	normalPath: str|None = None
-	heightPath: str|None = None
-
-	path: Path|None = None
-	# envmap: str = 'env_cubemap'
-	name: str = 'ThisShouldNeverAppear'
-	game: GameTarget = Preset.game
-	mode: MaterialMode = Preset.mode
+	# Slots can't have class-level defaults, so every field is set in __init__.
+	__slots__ = ('images', 'paths', 'path', 'name', 'game', 'mode', 'decodeCache', 'lock')
+
+	images: dict[ImageRole, Image|None]
+	''' The decoded image of each role, or None if it has not been decoded yet. '''
+	paths: dict[ImageRole, str|None]
+	''' The file picked for each role. '''
+
+	path: Path|None
+	# envmap: str
+	name: str
+	game: GameTarget
+	mode: MaterialMode
+
+	decodeCache: OrderedDict[str, tuple[tuple[int, int], Image]]
+	''' Decoded images by path, along with the (mtime, size) of the file when it was decoded. Least recently used first. '''
+	lock: threading.Lock
+	''' Guards images, paths and decodeCache, which the GUI thread updates while an export runs on a worker. '''
 
 	def __init__(self) -> None:
-		pass
+		self.images = {role: None for role in ImageRole}
+		self.paths = {role: None for role in ImageRole}
+
+		self.path = None
+		# self.envmap = 'env_cubemap'
+		self.name = 'ThisShouldNeverAppear'
+		self.game = Preset.game
+		self.mode = Preset.mode
+
+		self.decodeCache = OrderedDict()
+		self.lock = threading.Lock()
 
 	def load_preset(self, preset: Preset):
 		self.game = preset.game
@@ -57,121 +122,202 @@ class CoreBackend():
 	def save_preset(self, preset: Preset):
 		preset.game = self.game
 		preset.mode = self.mode
-		preset.set_path(ImageRole.Albedo, self.albedoPath)
-		preset.set_path(ImageRole.Roughness, self.roughnessPath)
-		preset.set_path(ImageRole.Metallic, self.metallicPath)
-		preset.set_path(ImageRole.Emit, self.emitPath)
-		preset.set_path(ImageRole.AO, self.aoPath)
-		preset.set_path(ImageRole.Normal, self.normalPath)
-		preset.set_path(ImageRole.Height, self.heightPath)
-
-	def convert(self, path: str, role: ImageRole) -> tuple[QImage, Image]:
-		image: QImage = QImage()
-		converted: Image|None = None
-		if path.endswith('.vtf') or path.endswith('.hdr'):
-			converted = QtIOBackend.load(path)
-			image = image_to_qimage(converted)
-		else:
-			image = QtIOBackend.load_qimage(path)
-			converted = qimage_to_image(image)
-
-		match role:
-			case ImageRole.Albedo: self.albedo = converted
-			case ImageRole.Roughness: self.roughness = converted
-			case ImageRole.Metallic: self.metallic = converted
-			case ImageRole.Emit: self.emit = converted
-			case ImageRole.AO: self.ao = converted
-			case ImageRole.Normal: self.normal = converted
-			case ImageRole.Height: self.height = converted
-
-		# converted.convert(np.uint8).save('./TEST.vtf')
-		return (image, converted)
-
-	def pick(self, path: str|None, role: ImageRole) -> QImage|None:
-		# Update current path
-		self.__setattr__(role+'Path', path)
-			
-		if path:
-			# Cache image
-			return self.convert(path, role)[0]
-		else:
-			# Remove cached image
-			self.__setattr__(role, None)
-			return None
+		preset.paths = {role: Path(path) for role, path in self.paths.items() if path is not None}
+
+	@staticmethod
+	def decode(path: str) -> Image:
+		''' Decodes an image from the filesystem. This does not touch the backend, so it is safe to call from worker threads. '''
+		if image_format(path) in NATIVE_FORMATS:
+			return QtIOBackend.load(path)
+		return qimage_to_image(QtIOBackend.load_qimage(path))
+
+	def fetch(self, path: str) -> tuple[tuple[int, int], Image]:
+		'''
+		Decodes an image, unless the file hasn't changed on disk since it was last decoded.
+		This only reads from the backend, so it is safe to call from several threads at once.
+		Returns ((mtime, size), converted)
+		'''
+		stat = os.stat(path)
+		stamp = (stat.st_mtime_ns, stat.st_size)
+		with self.lock: cached = self.decodeCache.get(path)
+		if cached is not None and cached[0] == stamp: return cached
+
+		return (stamp, CoreBackend.decode(path))
+
+	def store(self, path: str, role: ImageRole, entry: tuple[tuple[int, int], Image]):
+		''' Caches an entry returned by fetch, evicting the least recently used images once the cache is full. '''
+		with self.lock:
+			self.decodeCache[path] = entry
+			self.decodeCache.move_to_end(path)
+			while len(self.decodeCache) > DECODE_CACHE_SIZE:
+				self.decodeCache.popitem(last=False)
+
+			# When exporting on a worker, the role may have been re-picked while this was decoding.
+			if self.paths[role] != path: return
+			self.images[role] = entry[1]
+
+	def set_path(self, role: ImageRole, path: str|None):
+		''' Updates the path of a role without decoding it. The previously-cached image is discarded. '''
+		with self.lock:
+			self.paths[role] = path
+			self.images[role] = None
+
+	def invalidate(self, path: str):
+		''' Discards the cached image of every role that uses this path, so that it is re-decoded on the next export. '''
+		with self.lock:
+			for role in ImageRole:
+				if self.paths[role] == path:
+					self.images[role] = None
 
 	def pick_vmt(self, pathStr: str):
-		path = Path(pathStr)
-		self.path = path.parent
+		self.path, self.name = parse_material_name(pathStr)
+
+	def check_inputs(self):
+		''' Raises a ValueError if a required image has not been picked, before any work is done. '''
+		if self.paths[ImageRole.Albedo] is None: raise ValueError('A basetexture is required to convert the material!')
+		if self.paths[ImageRole.Roughness] is None: raise ValueError('A roughness map is required to convert the material!')
 
-		name = path.name.removesuffix('.vmt')
-		namePath = ''
-		useNamePath = False
-		for component in reversed(path.parts[:-1]):
-			if component == 'materials':
-				useNamePath = True
-				break
-			namePath = component + '/' + namePath
+	def make_material(self, noCache: bool=False, progress: Callable[[float], None]|None=None):
+		''' Generate the material from the collected textures. If provided, progress is called with the fraction of images that have been loaded. '''
+		images: dict[ImageRole, Image|None] = {}
+		pending: list[tuple[ImageRole, str]] = []
 
-		self.name = namePath+name if useNamePath else name
+		with self.lock:
+			for role in ImageRole:
+				image = None if noCache else self.images[role]
+				rolePath = self.paths[role]
+				if image is None and rolePath is not None:	pending.append((role, rolePath))
+				else:										images[role] = image
 
-	def make_material(self, noCache: bool=False):
-		''' Generate the material from the collected textures. '''
+		if progress: progress(len(images) / len(ImageRole))
+
+		# Re-fetch images when the cache is disabled, or they have not been decoded yet.
+		# Each image is independent, and decoding mostly happens in Qt/numpy without holding the GIL.
+		if len(pending):
+			with ThreadPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1)) as pool:
+				futures = {pool.submit(self.fetch, rolePath): (role, rolePath) for role, rolePath in pending}
+				for future in as_completed(futures):
+					role, rolePath = futures[future]
+					entry = future.result()
+					self.store(rolePath, role, entry)
+					images[role] = entry[1]
+					if progress: progress(len(images) / len(ImageRole))
 
 		def getImage(role: ImageRole) -> Image|None:
-			''' Helper function for re-fetching images when the cache is disabled. '''
-			if noCache:
-				rolePath = self.__getattribute__(role+'Path')
-				if rolePath == None: return None
-				return self.convert(rolePath, role)[1]
-			return self.__getattribute__(role)
+			return images[role]
 
 		albedo = getImage(ImageRole.Albedo)
-		assert albedo != None, 'A basetexture is required to convert the material!'
+		if albedo is None: raise ValueError('A basetexture is required to convert the material!')
 
 		roughness = getImage(ImageRole.Roughness)
-		assert roughness != None, 'A roughness map is required to convert the material!'
+		if roughness is None: raise ValueError('A roughness map is required to convert the material!')
+
+		normal = getImage(ImageRole.Normal) or blank(roughness.size, (0.5, 0.5, 1.0))
+
+		# Every map is combined with the others, so they must all share one size.
+		# Blanks are made at that size, so that they never need resizing.
+		size = normal.size
 
-		metallic = getImage(ImageRole.Metallic) or Image.blank(roughness.size, (0.0,))
+		metallic = getImage(ImageRole.Metallic) or blank(size, (0.0,))
 		emit = getImage(ImageRole.Emit)
 		ao = getImage(ImageRole.AO)
-		normal = getImage(ImageRole.Normal) or Image.blank(roughness.size, (0.5, 0.5, 1.0))
-		height = getImage(ImageRole.Height) or Image.blank(normal.size, (0.5,))
+		height = getImage(ImageRole.Height) or blank(size, (0.5,))
 
-		print('Constructing material...')
+		logger.debug('Constructing material...')
+
+		maps: dict[str, tuple[Image, Literal['L', 'RGB']]] = {
+			'albedo': (albedo, 'RGB'),
+			'roughness': (roughness, 'L'),
+			'metallic': (metallic, 'L'),
+			'normal': (normal, 'RGB'),
+			'height': (height, 'L'),
+		}
+		if emit: maps['emit'] = (emit, 'L')
+		if ao: maps['ao'] = (ao, 'L')
+
+		normalized = run_jobs(size, ((key, partial(texops.normalize, image, size, mode=mode, dtype=MATERIAL_DTYPE)) for key, (image, mode) in maps.items()))
 
 		return Material(
 			self.mode,
 			self.game,
-			normal.size,
+			size,
 			self.name,
-			albedo=texops.normalize(albedo, mode='RGB'),
-			roughness=texops.normalize(roughness, normal.size, mode='L'),
-			metallic=texops.normalize(metallic, normal.size, mode='L'),
-			emit=texops.normalize(emit, albedo.size, mode='L') if emit else None,
-			ao=texops.normalize(ao, albedo.size, mode='L') if ao else None,
-			normal=texops.normalize(normal, mode='RGB'),
-			height=texops.normalize(height, normal.size, mode='L') if height else None
+			albedo=normalized['albedo'],
+			roughness=normalized['roughness'],
+			metallic=normalized['metallic'],
+			emit=normalized.get('emit'),
+			ao=normalized.get('ao'),
+			normal=normalized['normal'],
+			height=normalized['height']
 		)
 
+	def passthrough(self, material: Material, version: int) -> dict[str, str]:
+		'''
+		Finds textures that would come out identical to one of the source files, so that they can be copied instead of re-encoded.
+		Returns {texture name: source path}
+		'''
+		sources: dict[str, str] = {}
+
+		# PBR bumpmaps are the normal map as-is, which is never resized since it sets the material size.
+		normalPath = self.paths[ImageRole.Normal]
+		if not MaterialMode.is_pbr(material.mode) or normalPath is None or image_format(normalPath) != 'vtf':
+			return sources
+
+		try:
+			header = read_vtf_header(normalPath)
+		except (OSError, ValueError):
+			return sources
+
+		# Compare against the header QtIOBackend.save would write, so that user-authored flags, mipmaps or resources are never copied.
+		width, height = material.size
+		expected = VTF(width, height, (7, version), fmt=ImageFormats.RGB888, flags=VTFFlags.EMPTY)
+		if header.version == expected.version and header.format == expected.format and (header.width, header.height) == material.size \
+				and header.frame_count == 1 and header.depth == 1 and header.flags == expected.flags \
+				and header.mipmap_count == expected.mipmap_count and header.low_format == expected.low_format \
+				and header.bumpmap_scale == expected.bumpmap_scale and header.reflectivity == expected.reflectivity \
+				and not header.resources and not header.sheet_info and header.hotspot_info is None:
+			sources['_bump'] = normalPath
+
+		return sources
+
 	def export(self, material: Material):
-		assert self.path != None and self.name != None, 'Something has gone very very wrong. Find a developer!'
+		if self.path is None or self.name is None: raise RuntimeError('Something has gone very very wrong. Find a developer!')
 
 		# TODO: This is kinda dumb
 		material.name = self.name
 
-		print('Creating textures...')
-		textures = core_export(material)
-		textureVersion = GameTarget.vtf_version(material.target)
-
-		print('Making VMT...')
+		logger.debug('Making VMT...')
 		vmt = core_make_vmt(material)
 		
 		isolatedName = self.name.rsplit('/', 1)[-1]
+		prefix = os.fspath(self.path) + os.sep + isolatedName
+		textureVersion = GameTarget.vtf_version(material.target)
 
-		print('Writing files...')
-		with open(self.path / (isolatedName + '.vmt'), 'w') as vmtFile:
-			vmtFile.write(vmt)
+		sources = self.passthrough(material, textureVersion)
+		renames: dict[str, str] = {}
+		''' {temporary path: final path} '''
+
+		def save(texture: Texture) -> Callable[[], object]:
+			# Textures are saved under temporary names, so that a failed export leaves the previous material untouched.
+			tempPath = prefix + texture.name + '.tmp.vtf'
+			renames[tempPath] = prefix + texture.name + '.vtf'
+			if texture.name in sources: return partial(shutil.copyfile, sources[texture.name], tempPath)
+			return partial(texture.image.save, tempPath, version=textureVersion)
+
+		# Each texture starts saving as soon as it is created, while the next one is being built.
+		logger.debug('Creating textures...')
+		try:
+			run_jobs(material.size, ((texture.name, save(texture)) for texture in core_iter_export(material)))
+		except BaseException:
+			for tempPath in renames:
+				try:				os.remove(tempPath)
+				except OSError:		pass
+			raise
 
-		for texture in textures:
-			fullPath = self.path / (isolatedName + texture.name + '.vtf')
-			texture.image.save(fullPath, version=textureVersion)
+		logger.debug('Writing files...')
+		for tempPath, fullPath in renames.items():
+			os.replace(tempPath, fullPath)
+
+		# The VMT goes last, so it never references textures that failed to build.
+		with open(prefix + '.vmt', 'w') as vmtFile:
+			vmtFile.write(vmt)
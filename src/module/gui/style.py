@@ -1,5 +1,7 @@
 STYLESHEET_TILE_REQUIRED = '''
-border-color: #999;
+PickableImage[required="true"][empty="true"] QToolButton {
+	border-color: #999;
+}
 '''
 
 STYLESHEET_MIN = '''
@@ -0,0 +1,83 @@
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from typing import TYPE_CHECKING
+from traceback import format_exc
+import logging
+
+if TYPE_CHECKING:
+	from .backend import CoreBackend, ImageRole
+
+logger = logging.getLogger(__name__)
+
+class DecodeSignals( QObject ):
+	decoded = Signal( str, int, object, name='Decoded', arguments=['Kind', 'RequestId', 'Thumbnail'] )
+	''' Fires when a worker has finished decoding a thumbnail. (QImage|None) '''
+
+class ExportSignals( QObject ):
+	progress = Signal( int, name='Progress' )
+	''' Fires as the export advances. (0-100) '''
+	done = Signal( name='Done' )
+	''' Fires once every file has been written. '''
+	failed = Signal( object, str, name='Failed', arguments=['Error', 'Traceback'] )
+	''' Fires if the export raised an exception. '''
+
+class DecodeTask( QRunnable ):
+	'''
+	Decodes an image thumbnail on the global thread pool. Only QImages are produced here,
+	since QPixmaps may only be touched by the GUI thread. The full-resolution image is
+	left for the backend to decode on export.
+	'''
+
+	kind: 'ImageRole'
+	path: str
+	size: int
+	requestId: int
+	signals: DecodeSignals
+
+	def __init__(self, kind: 'ImageRole', path: str, size: int, requestId: int, signals: DecodeSignals) -> None:
+		super().__init__()
+		self.kind = kind
+		self.path = path
+		self.size = size
+		self.requestId = requestId
+		self.signals = signals
+
+	def run(self) -> None:
+		from ..core.io.qtio import QtIOBackend
+
+		thumbnail = None
+		try:
+			# Decode at 2x to keep the icon sharp on HiDPI screens.
+			thumbnail = QtIOBackend.load_thumbnail(self.path, self.size * 2)
+			if thumbnail.isNull(): thumbnail = None
+		except Exception:
+			logger.error('Failed to decode image!\n\n%s', format_exc())
+		self.signals.decoded.emit(self.kind, self.requestId, thumbnail)
+
+class ExportTask( QRunnable ):
+	'''
+	Builds and writes a material on the global thread pool, so that the GUI stays
+	responsive while the textures are encoded. Only one export may run at a time.
+	'''
+
+	backend: 'CoreBackend'
+	target: str
+	noCache: bool
+	signals: ExportSignals
+
+	def __init__(self, backend: 'CoreBackend', target: str, noCache: bool, signals: ExportSignals) -> None:
+		super().__init__()
+		self.backend = backend
+		self.target = target
+		self.noCache = noCache
+		self.signals = signals
+
+	def run(self) -> None:
+		try:
+			material = self.backend.make_material(self.noCache, lambda x: self.signals.progress.emit(round(x * 50)))
+			self.backend.pick_vmt(self.target)
+			self.backend.export(material)
+			self.signals.progress.emit(100)
+			self.signals.done.emit()
+		except Exception as e:
+			self.signals.failed.emit(e, format_exc())
@@ -3,10 +3,14 @@ from pathlib import Path
 from .core.material import MaterialMode, GameTarget
 
 class Preset():
-	paths: dict[str, Path] = {}
+	paths: dict[str, Path]
 	game: GameTarget = GameTarget.V2011
 	mode: MaterialMode = MaterialMode.PBRModel
 
+	def __init__(self) -> None:
+		# Each preset needs its own dict. A class-level one would be shared by every preset that has been loaded.
+		self.paths = {}
+
 	@staticmethod
 	def load(pathStr: str):
 		path = Path(pathStr)